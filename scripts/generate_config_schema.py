@@ -4,22 +4,34 @@
 Uses `ansible-doc -t role --json` to extract role specs and converts them
 to a JSON Schema for editor integration (autocompletion, validation, hover docs).
 
+The ansible-doc output is cached under .cache/ansible-doc-specs/, keyed on
+the ansible-core version, the role names and the mtimes of their meta files,
+so repeated runs (editor save hooks, pre-commit) skip the subprocess when no
+role spec changed.
+
 Usage:
-    mise x -- uv run python scripts/generate_config_schema.py
+    mise x -- uv run python scripts/generate_config_schema.py [--no-cache]
 """
 
 from __future__ import annotations
 
+import argparse
+import hashlib
+import importlib.metadata
 import json
+import os
 import subprocess
 import sys
+import tempfile
 from pathlib import Path
 
 PROJECT_ROOT = Path(__file__).resolve().parent.parent
 ROLES_DIR = PROJECT_ROOT / "roles"
 OUTPUT_FILE = PROJECT_ROOT / "schemas" / "config.schema.json"
+CACHE_DIR = PROJECT_ROOT / ".cache" / "ansible-doc-specs"
 
-# Ansible type -> JSON Schema type mapping
+# Ansible type -> JSON Schema type mapping. Entries are shared by reference
+# across the generated schema (e.g. as list "items"), so never mutate them.
 TYPE_MAP: dict[str, dict] = {
     "str": {"type": "string"},
     "int": {"type": "integer"},
@@ -50,7 +62,7 @@ def convert_option(name: str, spec: dict) -> dict:
         if elements == "dict" and spec.get("options"):
             schema["items"] = convert_options_to_object(spec["options"])
         elif elements in TYPE_MAP:
-            schema["items"] = TYPE_MAP[elements].copy()
+            schema["items"] = TYPE_MAP[elements]
         else:
             schema["items"] = {}
     elif ansible_type in TYPE_MAP:
@@ -62,10 +74,9 @@ def convert_option(name: str, spec: dict) -> dict:
         schema["enum"] = spec["choices"]
 
     # Default value (skip Jinja2 templates)
-    if "default" in spec and spec["default"] is not None:
-        default = spec["default"]
-        if not isinstance(default, str) or "{{" not in default:
-            schema["default"] = default
+    default = spec.get("default")
+    if default is not None and (not isinstance(default, str) or "{{" not in default):
+        schema["default"] = default
 
     return schema
 
@@ -87,8 +98,64 @@ def convert_options_to_object(options: dict) -> dict:
     return result
 
 
-def extract_specs_via_ansible_doc(role_names: list[str]) -> dict:
-    """Run ansible-doc to get role specs as JSON."""
+def specs_cache_key(role_names: list[str]) -> str:
+    """Hash the ansible-core version, role names and meta file mtimes."""
+    try:
+        ansible_version = importlib.metadata.version("ansible-core")
+    except importlib.metadata.PackageNotFoundError:
+        ansible_version = "unknown"
+    meta_files = sorted(ROLES_DIR.glob("*/meta/argument_specs.*")) + sorted(
+        ROLES_DIR.glob("*/meta/main.*")
+    )
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(ansible_version.encode())
+    digest.update(b"\0")
+    digest.update("\0".join(role_names).encode())
+    for path in meta_files:
+        digest.update(b"\0")
+        digest.update(
+            f"{path.relative_to(ROLES_DIR)}:{path.stat().st_mtime_ns}".encode()
+        )
+    return digest.hexdigest()
+
+
+def read_specs_cache(cache_file: Path) -> dict | None:
+    """Return cached specs, or None if the entry is missing or unreadable."""
+    try:
+        return json.loads(cache_file.read_bytes())
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+def write_specs_cache(cache_file: Path, specs: dict) -> None:
+    """Atomically write specs to the cache and drop entries for other keys."""
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    # Write to a temp file and rename it into place, so an interrupted or
+    # concurrent run never leaves a partial entry behind.
+    fd, tmp_name = tempfile.mkstemp(dir=CACHE_DIR, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(specs, f)
+        os.replace(tmp_name, cache_file)
+    except BaseException:
+        Path(tmp_name).unlink(missing_ok=True)
+        raise
+    for stale in CACHE_DIR.glob("*.json"):
+        if stale != cache_file:
+            stale.unlink(missing_ok=True)
+
+
+def extract_specs_via_ansible_doc(
+    role_names: list[str], use_cache: bool = True
+) -> dict:
+    """Run ansible-doc to get role specs as JSON, reusing the on-disk cache."""
+    cache_file = CACHE_DIR / f"{specs_cache_key(role_names)}.json"
+    if use_cache:
+        cached = read_specs_cache(cache_file)
+        if cached is not None:
+            print(f"Using cached ansible-doc output ({cache_file.name})")
+            return cached
+
     cmd = [
         "ansible-doc",
         "-t",
@@ -98,32 +165,40 @@ def extract_specs_via_ansible_doc(role_names: list[str]) -> dict:
         str(ROLES_DIR),
         *role_names,
     ]
-    result = subprocess.run(cmd, capture_output=True, text=True, check=False)
+    # Capture raw bytes: json.loads parses UTF-8 directly, skipping a decode pass
+    result = subprocess.run(
+        cmd, capture_output=True, stdin=subprocess.DEVNULL, check=False
+    )
     if result.returncode != 0:
         print(
             f"Warning: ansible-doc exited with code {result.returncode}",
             file=sys.stderr,
         )
         if result.stderr:
-            print(result.stderr, file=sys.stderr)
-    return json.loads(result.stdout)
+            print(result.stderr.decode(errors="replace"), file=sys.stderr)
+    specs = json.loads(result.stdout)
 
+    # Only cache clean runs
+    if use_cache and result.returncode == 0:
+        write_specs_cache(cache_file, specs)
+    return specs
 
-def build_schema() -> dict:
+
+def build_schema(use_cache: bool = True) -> dict:
     """Build the complete JSON Schema from all role specs."""
     # Discover roles
-    role_names = sorted(
-        d.name for d in ROLES_DIR.iterdir() if d.is_dir() and not d.name.startswith(".")
-    )
+    with os.scandir(ROLES_DIR) as entries:
+        role_names = sorted(
+            e.name for e in entries if e.is_dir() and not e.name.startswith(".")
+        )
 
     print(f"Extracting specs from {len(role_names)} roles: {', '.join(role_names)}")
-    all_specs = extract_specs_via_ansible_doc(role_names)
+    all_specs = extract_specs_via_ansible_doc(role_names, use_cache=use_cache)
 
     # Merge all role options into top-level properties
     properties: dict = {}
-    seen_vars: dict[
-        str, str
-    ] = {}  # variable_name -> role_name (for duplicate detection)
+    # variable_name -> first role defining it (for duplicate detection)
+    seen_vars: dict[str, str] = {}
 
     for role_name in role_names:
         role_data = all_specs.get(role_name, {})
@@ -136,13 +211,13 @@ def build_schema() -> dict:
 
         print(f"  {role_name}: {len(options)} option(s)")
         for var_name, var_spec in options.items():
-            if var_name in seen_vars:
+            owner = seen_vars.setdefault(var_name, role_name)
+            if owner != role_name:
                 print(
                     f"  WARNING: duplicate variable '{var_name}' "
-                    f"in roles '{seen_vars[var_name]}' and '{role_name}'",
+                    f"in roles '{owner}' and '{role_name}'",
                     file=sys.stderr,
                 )
-            seen_vars[var_name] = role_name
             properties[var_name] = convert_option(var_name, var_spec)
 
     # Add special 'profile' key (not from any role — it's consumed by the inventory plugin)
@@ -172,7 +247,7 @@ def build_schema() -> dict:
         "title": "Dotfiles Profile Configuration",
         "description": "Configuration schema for dotfiles profile config.yml files",
         "type": "object",
-        "properties": dict(sorted(properties.items())),
+        "properties": properties,
         "additionalProperties": True,
     }
 
@@ -181,11 +256,18 @@ def build_schema() -> dict:
 
 
 def main() -> None:
-    schema = build_schema()
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Always run ansible-doc and do not read or write the specs cache",
+    )
+    args = parser.parse_args()
+
+    schema = build_schema(use_cache=not args.no_cache)
     OUTPUT_FILE.parent.mkdir(parents=True, exist_ok=True)
-    with open(OUTPUT_FILE, "w") as f:
-        json.dump(schema, f, indent=2)
-        f.write("\n")
+    # sort_keys orders properties during encoding, without rebuilding any dicts
+    OUTPUT_FILE.write_text(json.dumps(schema, indent=2, sort_keys=True) + "\n")
     print(f"Schema written to {OUTPUT_FILE.relative_to(PROJECT_ROOT)}")
 
 